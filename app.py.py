@@ -1,48 +1,137 @@
 import streamlit as st
-import json
+import os
 import random
-import time
-import base64
+import zlib
+import pybase64
+import msgpack
+import orjson
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
 # --- Helper Functions ---
 
-@st.cache_data
-def load_questions():
-    # Update this filename if you change the JSON file name again!
+# Update this filename if you change the JSON file name again!
+QUESTIONS_FILE = 'exam_formatted_game.json'
+
+# Every question in the bank uses these keys, already in display order
+_OPTION_KEYS = ("A", "B", "C", "D")
+
+# Save codes start with this header (before compression) and are rejected beyond this length,
+# or when they inflate past the JSON limit
+_SAVE_MAGIC = b"QZ01"
+_MAX_SAVE_CODE_LEN = 512 * 1024
+_MAX_SAVE_JSON_LEN = 4 * 1024 * 1024
+
+# Only the most recent exams are kept in the leaderboard history
+_HISTORY_LIMIT = 200
+
+# Questions shown per page of the simulation-mode exam review
+_REVIEW_PAGE_SIZE = 20
+
+# The msgpack copy is only a cache: if it can't be read or written, the JSON is used instead
+def _read_msgpack(path):
+    try:
+        with open(path, 'rb') as f:
+            return msgpack.unpack(f)
+    except (OSError, ValueError, msgpack.UnpackException):
+        return None
+
+def _write_msgpack(path, data):
+    # Written aside and swapped in, so a crash mid-write can't leave a truncated copy behind
+    tmp_path = path + '.tmp'
     try:
-        with open('exam_formatted_game.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(tmp_path, 'wb') as f:
+            msgpack.pack(data, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+# DO NOT MUTATE the returned list or its questions — it is shared across users
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_questions(json_path):
+    msgpack_path = os.path.splitext(json_path)[0] + '.msgpack'
+    try:
+        # Re-pack the question bank whenever the JSON is newer than the msgpack copy
+        data = None
+        if os.path.exists(msgpack_path) and os.path.getmtime(msgpack_path) >= os.path.getmtime(json_path):
+            data = _read_msgpack(msgpack_path)
+        if data is None:
+            with open(json_path, 'rb') as f:
+                data = orjson.loads(f.read())
+            _write_msgpack(msgpack_path, data)
     except FileNotFoundError:
-        st.error("Error: 'exam_formatted_game.json' not found.")
+        st.error(f"Error: '{json_path}' not found.")
         return []
 
+    # Option order and radio labels are built once here instead of on every rerun
+    for q in data:
+        options = q['options']
+        keys = _OPTION_KEYS if options.keys() <= set(_OPTION_KEYS) else sorted(options)
+        q['option_keys'] = tuple(k for k in keys if k in options)
+        q['choice_labels'] = tuple(f"{k}: {options[k]}" for k in q['option_keys'])
+    return data
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _encode_save(current_index, score, quiz_data_json, history_json, incorrect_json, simulation_mode, user_answers_json):
+    """Builds the compressed base64 save code from pre-serialized state (identical states reuse the cached code)"""
+    raw = (
+        b'{"current_index":%d,"score":%d,"quiz_data":%b,"history":%b,'
+        b'"incorrect_indices":%b,"simulation_mode":%b,"user_answers":%b}'
+        % (current_index, score, quiz_data_json, history_json, incorrect_json, orjson.dumps(simulation_mode), user_answers_json)
+    )
+    return pybase64.b64encode_as_string(_SAVE_MAGIC + zlib.compress(raw, 6))
+
 def generate_save_code():
     """Encodes the current game state AND history into a base64 string"""
-    state_data = {
-        'current_index': st.session_state.current_index,
-        'score': st.session_state.score,
-        'quiz_data': st.session_state.quiz_data,
-        'history': st.session_state.history, 
-        'incorrect_indices': st.session_state.incorrect_indices,
-        'simulation_mode': st.session_state.simulation_mode,
-        'user_answers': st.session_state.user_answers
-    }
-    json_str = json.dumps(state_data, default=str)
-    b64_str = base64.b64encode(json_str.encode()).decode()
-    return b64_str
+    return _encode_save(
+        st.session_state.current_index,
+        st.session_state.score,
+        orjson.dumps(st.session_state.quiz_data),
+        orjson.dumps({
+            'Date': st.session_state.history_dates,
+            'Score': st.session_state.history_score_strs,
+            'Score (%)': st.session_state.history_pct
+        }, option=orjson.OPT_SERIALIZE_NUMPY),
+        orjson.dumps(st.session_state.incorrect_indices),
+        st.session_state.simulation_mode,
+        orjson.dumps(st.session_state.user_answers)
+    )
 
 def load_save_code(code):
     """Decodes a save string and restores the game and history"""
+    code = code.strip()
+    if len(code) > _MAX_SAVE_CODE_LEN:
+        return False
     try:
-        json_str = base64.b64decode(code).decode()
-        state_data = json.loads(json_str)
-        
+        raw = pybase64.b64decode(code, validate=True)
+        if not raw.startswith(_SAVE_MAGIC):
+            return False
+        # Inflate at most the JSON limit, so a tiny code can't expand into gigabytes
+        inflater = zlib.decompressobj()
+        payload = inflater.decompress(raw[len(_SAVE_MAGIC):], _MAX_SAVE_JSON_LEN)
+        if inflater.unconsumed_tail:
+            return False
+        state_data = orjson.loads(payload)
+        if not _valid_save(state_data):
+            return False
+
+        # Build everything first, so a bad value can't leave session state half-loaded
+        quiz_data = state_data['quiz_data']
+        answer_keys = _answer_keys(quiz_data)
+        history = state_data.get('history', {})
+        history_pct = np.asarray(history.get('Score (%)', []), dtype=np.float32)
+
         st.session_state.current_index = state_data.get('current_index', 0)
         st.session_state.score = state_data.get('score', 0)
-        st.session_state.quiz_data = state_data.get('quiz_data', [])
-        st.session_state.history = state_data.get('history', [])
+        st.session_state.quiz_data = quiz_data
+        st.session_state.answer_keys = answer_keys
+        st.session_state.history_dates = history.get('Date', [])
+        st.session_state.history_score_strs = history.get('Score', [])
+        st.session_state.history_pct = history_pct
         st.session_state.incorrect_indices = state_data.get('incorrect_indices', [])
         st.session_state.simulation_mode = state_data.get('simulation_mode', False)
         st.session_state.user_answers = state_data.get('user_answers', [])
@@ -50,45 +139,104 @@ def load_save_code(code):
         st.session_state.game_active = True
         st.session_state.quiz_finished = False
         st.session_state.answer_submitted = False
+        _clear_question_keys()
         return True
     except Exception as e:
         return False
 
+def _in_bank(indices):
+    return type(indices) is list and all(type(i) is int and 0 <= i < len(raw_questions) for i in indices)
+
+def _valid_save(state_data):
+    """Checks a decoded save against the question bank before any of it reaches session state"""
+    # Every container must have the exact type the callbacks and _gameover mutate in place
+    if type(state_data) is not dict:
+        return False
+
+    # Saved questions (and missed ones) are indices into the question bank, so they must still fit it
+    quiz_data = state_data.get('quiz_data')
+    if not quiz_data or not _in_bank(quiz_data) or not _in_bank(state_data.get('incorrect_indices', [])):
+        return False
+    current_index = state_data.get('current_index', 0)
+    if type(current_index) is not int or not 0 <= current_index < len(quiz_data):
+        return False
+    score = state_data.get('score', 0)
+    if type(score) is not int or not 0 <= score <= len(quiz_data):
+        return False
+    sim_mode = state_data.get('simulation_mode', False)
+    if type(sim_mode) is not bool:
+        return False
+
+    # Simulation answers fill the quiz in order, up to the current question
+    user_answers = state_data.get('user_answers', [])
+    if type(user_answers) is not list or len(user_answers) > len(quiz_data):
+        return False
+    if sim_mode and len(user_answers) < current_index:
+        return False
+    if not all(ans in raw_questions[i]['option_keys'] for ans, i in zip(user_answers, quiz_data)):
+        return False
+
+    history = state_data.get('history', {})
+    if type(history) is not dict:
+        return False
+    columns = [history.get(col, []) for col in ('Date', 'Score', 'Score (%)')]
+    if not all(type(col) is list for col in columns):
+        return False
+    dates, score_strs, _ = columns
+    if not all(type(v) is str for v in dates + score_strs):
+        return False
+    return len({len(col) for col in columns}) == 1
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _leaderboard_data(dates, score_strs, pct):
+    """Builds the leaderboard table and average score from the history columns"""
+    # Widen before display so float32 scores don't render as 66.699997
+    df = pd.DataFrame({"Date": dates, "Score": score_strs, "Score (%)": pct.astype(np.float64).round(1)})
+    avg_score = float(pct.mean()) if pct.size else 0.0
+    return df, avg_score
+
+def _answer_keys(quiz_data):
+    """Lists the correct answer for each position in the quiz"""
+    return [raw_questions[i]['answer_key'] for i in quiz_data]
+
+def _clear_question_keys():
+    """Drops the radio state Streamlit keeps for every question already shown"""
+    for key in [k for k in st.session_state if k.startswith("q_")]:
+        del st.session_state[key]
+
 # --- Initialization ---
-if 'game_active' not in st.session_state:
-    st.session_state.game_active = False
-if 'quiz_finished' not in st.session_state:
-    st.session_state.quiz_finished = False
-if 'history' not in st.session_state:
-    st.session_state.history = [] 
-if 'incorrect_indices' not in st.session_state:
-    st.session_state.incorrect_indices = [] 
-if 'simulation_mode' not in st.session_state:
-    st.session_state.simulation_mode = False
-if 'user_answers' not in st.session_state:
-    st.session_state.user_answers = []
-
-raw_questions = load_questions()
+st.session_state.setdefault('game_active', False)
+st.session_state.setdefault('quiz_finished', False)
+st.session_state.setdefault('history_dates', [])
+st.session_state.setdefault('history_score_strs', [])
+st.session_state.setdefault('history_pct', np.empty(0, dtype=np.float32))
+st.session_state.setdefault('incorrect_indices', [])
+st.session_state.setdefault('simulation_mode', False)
+st.session_state.setdefault('user_answers', [])
+
+raw_questions = load_questions(QUESTIONS_FILE)
 
 # ==========================================
 # SCREEN 1: THE START MENU (HOME)
 # ==========================================
-if not st.session_state.game_active and not st.session_state.quiz_finished:
-    st.title("🎓 Exam Simulator Pro")
-    st.markdown("Welcome back! Ready to master the material?")
-
-    # --- LEADERBOARD / HISTORY SECTION ---
-    if st.session_state.history:
+@st.fragment
+def _leaderboard():
+    ss = st.session_state
+    dates = ss.history_dates
+    if dates:
         with st.expander("🏆 Your Progress (Leaderboard)", expanded=False):
-            df = pd.DataFrame(st.session_state.history)
+            pct = ss.history_pct
+            df, avg_score = _leaderboard_data(tuple(dates), tuple(ss.history_score_strs), pct)
             st.dataframe(df, use_container_width=True)
             
-            if len(df) > 1:
-                st.line_chart(df.set_index("Date")["Score (%)"])
+            if len(pct) > 1:
+                st.line_chart(df, x="Date", y="Score (%)")
             
-            avg_score = df["Score (%)"].mean()
             st.metric("Average Performance", f"{avg_score:.1f}%")
 
+@st.fragment
+def _exam_setup():
+    ss = st.session_state
     with st.container(border=True):
         st.subheader("⚙️ Settings")
         
@@ -108,25 +256,22 @@ if not st.session_state.game_active and not st.session_state.quiz_finished:
     with col1:
         if st.button("▶️ Start New Exam", type="primary", use_container_width=True):
             if len(raw_questions) > 0:
-                with st.spinner("Preparing exam..."):
-                    time.sleep(1)
-                
-                # Setup Game State
-                subset_questions = raw_questions[:] 
+                # Setup Game State (quiz_data holds indices into raw_questions)
                 if shuffle_opt:
-                    random.shuffle(subset_questions)
-                
-                st.session_state.quiz_data = subset_questions[:q_limit]
-                st.session_state.current_index = 0
-                st.session_state.score = 0
-                st.session_state.incorrect_indices = []
-                st.session_state.user_answers = [] 
-                st.session_state.answer_submitted = False
-                st.session_state.simulation_mode = sim_mode
-                if "sim_scored" in st.session_state:
-                    del st.session_state.sim_scored
+                    ss.quiz_data = random.sample(range(len(raw_questions)), q_limit)
+                else:
+                    ss.quiz_data = list(range(q_limit))
+                ss.answer_keys = _answer_keys(ss.quiz_data)
+                ss.current_index = 0
+                ss.score = 0
+                ss.incorrect_indices = []
+                ss.user_answers = [] 
+                ss.answer_submitted = False
+                ss.simulation_mode = sim_mode
+                ss.pop("sim_scored", None)
+                _clear_question_keys()
                 
-                st.session_state.game_active = True
+                ss.game_active = True
                 st.rerun()
             else:
                 st.error("No questions loaded. Check your JSON file.")
@@ -138,240 +283,292 @@ if not st.session_state.game_active and not st.session_state.quiz_finished:
             if st.button("Resume"):
                 if load_save_code(save_code_input):
                     st.success("Loaded!")
-                    time.sleep(0.5)
                     st.rerun()
                 else:
                     st.error("Invalid Code.")
 
+def _home():
+    st.title("🎓 Exam Simulator Pro")
+    st.markdown("Welcome back! Ready to master the material?")
+
+    # --- LEADERBOARD / HISTORY SECTION ---
+    # Separate fragments, so the settings widgets don't redraw the leaderboard
+    _leaderboard()
+    _exam_setup()
+
 # ==========================================
 # SCREEN 2: THE GAME
 # ==========================================
-elif st.session_state.game_active and not st.session_state.quiz_finished:
-    
-    # --- Sidebar ---
+def _game_sidebar():
+    # Kept outside the fragment: fragments can't write to st.sidebar
     with st.sidebar:
         st.header("⏸ Menu")
+        # The code itself is drawn by _game, which reruns on every answer and drops it once it's stale
         if st.button("💾 Save Progress"):
-            code = generate_save_code()
-            st.code(code, language=None)
-            st.warning("Copy this code to save your history and current spot!")
+            st.session_state.save_code = generate_save_code()
             
         if st.button("❌ Quit to Menu"):
             st.session_state.game_active = False
+            st.session_state.pop("save_code", None)
+            _clear_question_keys()
             st.rerun()
 
+def _submit_answer():
+    # A double-click can deliver a second submit before the rerun hides the form
+    if st.session_state.answer_submitted:
+        return
+    current_idx = st.session_state.current_index
+    # The form sends its submit even when no option was picked
+    user_choice = st.session_state.get(f"q_{current_idx}")
+    if not user_choice:
+        return
+    selected_key = user_choice[:1]
+    st.session_state.submitted_key = selected_key
+    st.session_state.answer_submitted = True
+    st.session_state.pop("save_code", None)
+
+    # Callbacks run exactly once per click, so the answer can be scored right here
+    if selected_key == st.session_state.answer_keys[current_idx]:
+        st.session_state.score += 1
+    else:
+        st.session_state.incorrect_indices.append(st.session_state.quiz_data[current_idx])
+
+def _advance():
+    # The answer is recorded, so the radio state and any save code shown for this spot can go
+    st.session_state.pop(f"q_{st.session_state.current_index}", None)
+    st.session_state.pop("save_code", None)
+
+    if st.session_state.current_index + 1 < len(st.session_state.quiz_data):
+        st.session_state.current_index += 1
+    else:
+        st.session_state.quiz_finished = True
+        st.session_state.game_active = False
+
+def _next_question():
+    st.session_state.answer_submitted = False
+    _advance()
+
+def _save_sim_answer():
+    current_idx = st.session_state.current_index
+    user_choice = st.session_state.get(f"q_{current_idx}")
+    if not user_choice:
+        return
+    selected_key = user_choice[:1]
+
+    if current_idx == len(st.session_state.user_answers):
+        st.session_state.user_answers.append(selected_key)
+    else:
+        st.session_state.user_answers[current_idx] = selected_key
+    _advance()
+
+@st.fragment
+def _game():
+    ss = st.session_state
+    # Callbacks only rerun this fragment, so leaving the quiz needs a full rerun to switch screens
+    if ss.quiz_finished:
+        st.rerun()
+
+    if "save_code" in ss:
+        st.code(ss.save_code, language=None)
+        st.warning("Copy this code to save your history and current spot!")
+
     # --- Metrics ---
-    questions = st.session_state.quiz_data
+    questions = ss.quiz_data
     total_qs = len(questions)
-    current_idx = st.session_state.current_index
+    current_idx = ss.current_index
+    sim_mode = ss.simulation_mode
+    submitted = ss.answer_submitted
+    user_answers = ss.user_answers
     
     c1, c2 = st.columns([3, 1])
     with c1:
         st.caption(f"Question {current_idx + 1} of {total_qs}")
-        st.progress((current_idx + 1) / total_qs)
+        progress_pct = (current_idx + 1) / total_qs * 100
+        st.markdown(
+            '<div style="background:#eee;border-radius:4px">'
+            f'<div style="width:{progress_pct:.1f}%;background:#4ade80;height:6px;border-radius:4px"></div></div>',
+            unsafe_allow_html=True
+        )
     with c2:
-        if st.session_state.simulation_mode:
+        if sim_mode:
             st.caption("Mode: 🛑 DECA Simulation")
         else:
-            qs_answered = current_idx + (1 if st.session_state.answer_submitted else 0)
-            current_accuracy = (st.session_state.score / qs_answered) if qs_answered > 0 else 0.0
+            # Only study mode shows accuracy, so only it reads the score
+            score = ss.score
+            qs_answered = current_idx + (1 if submitted else 0)
+            current_accuracy = (score / qs_answered) if qs_answered else 0.0
             st.caption(f"Accuracy: {current_accuracy:.0%}")
-            st.progress(current_accuracy)
 
     # --- Question Display ---
-    q = questions[current_idx]
+    q = raw_questions[questions[current_idx]]
     st.subheader(f"{q['question_text']}")
     
-    options = q['options']
-    choice_labels = [f"{key}: {value}" for key, value in sorted(options.items())]
+    choice_labels = q['choice_labels']
     
     # Check if we already answered this in simulation mode (for going back/forth, though we only move forward currently)
     pre_selected = None
-    if st.session_state.simulation_mode and current_idx < len(st.session_state.user_answers):
-        pre_idx = list(sorted(options.keys())).index(st.session_state.user_answers[current_idx])
+    if sim_mode and current_idx < len(user_answers):
+        pre_idx = q['option_keys'].index(user_answers[current_idx])
         pre_selected = pre_idx
 
-    user_choice = st.radio(
-        "Select Answer:", 
-        choice_labels, 
-        key=f"q_{current_idx}", 
-        disabled=st.session_state.answer_submitted,
-        index=pre_selected
-    )
+    if not submitted:
+        # The radio sits in a form, so picking an option doesn't rerun anything;
+        # the choice arrives together with the Submit/Next click
+        with st.form(f"form_{current_idx}", border=False):
+            st.radio(
+                "Select Answer:", 
+                choice_labels, 
+                key=f"q_{current_idx}", 
+                index=pre_selected
+            )
 
-    # --- Interaction Logic ---
-    col_submit, col_empty = st.columns([1, 4])
-    
-    # ---- STUDY MODE LOGIC ----
-    if not st.session_state.simulation_mode:
-        if not st.session_state.answer_submitted:
+            # --- Interaction Logic ---
+            col_submit, col_empty = st.columns([1, 4])
             with col_submit:
-                if st.button("Submit Answer", type="primary"):
-                    if user_choice:
-                        st.session_state.answer_submitted = True
-                        st.rerun()
-                    else:
-                        st.toast("Please select an option first!", icon="⚠️")
-        else:
-            selected_key = user_choice.split(":")[0]
-            correct_key = q['answer_key']
-            
-            if selected_key == correct_key:
-                st.success("✅ Correct!")
-                if "scored_current" not in st.session_state:
-                    st.session_state.score += 1
-                    st.session_state.scored_current = True
-            else:
-                st.error(f"❌ Incorrect. Answer: {correct_key}")
-                if "scored_current" not in st.session_state:
-                    st.session_state.incorrect_indices.append(q) 
-                    st.session_state.scored_current = True
-                
-            st.info(f"**Rationale:** {q['rationale']}")
-            
-            if st.button("Next Question ➡"):
-                st.session_state.answer_submitted = False
-                if "scored_current" in st.session_state:
-                    del st.session_state.scored_current
-                
-                if current_idx + 1 < total_qs:
-                    st.session_state.current_index += 1
+                if sim_mode:
+                    button_text = "Next Question ➡" if current_idx + 1 < total_qs else "Finish Exam 🏁"
+                    clicked = st.form_submit_button(button_text, type="primary", on_click=_save_sim_answer)
                 else:
-                    st.session_state.quiz_finished = True
-                    st.session_state.game_active = False
-                st.rerun()
+                    clicked = st.form_submit_button("Submit Answer", type="primary", on_click=_submit_answer)
 
-    # ---- SIMULATION MODE LOGIC ----
+        # A submit that moved things along is gone by now, so a click still showing here had no pick
+        if clicked:
+            st.toast("Please select an option first!", icon="⚠️")
+
+    # ---- STUDY MODE LOGIC ----
     else:
-        with col_submit:
-            button_text = "Next Question ➡" if current_idx + 1 < total_qs else "Finish Exam 🏁"
-            if st.button(button_text, type="primary"):
-                if user_choice:
-                    selected_key = user_choice.split(":")[0]
-                    
-                    # Save user answer
-                    if current_idx == len(st.session_state.user_answers):
-                        st.session_state.user_answers.append(selected_key)
-                    else:
-                        st.session_state.user_answers[current_idx] = selected_key
-                        
-                    # Advance
-                    if current_idx + 1 < total_qs:
-                        st.session_state.current_index += 1
-                    else:
-                        st.session_state.quiz_finished = True
-                        st.session_state.game_active = False
-                    st.rerun()
-                else:
-                    st.toast("Please select an option first!", icon="⚠️")
+        selected_key = ss.submitted_key
+        correct_key = q['answer_key']
+
+        # Read-only copy of the submitted answer
+        st.radio(
+            "Select Answer:", 
+            choice_labels, 
+            index=q['option_keys'].index(selected_key),
+            disabled=True
+        )
+        
+        if selected_key == correct_key:
+            st.success("✅ Correct!")
+        else:
+            st.error(f"❌ Incorrect. Answer: {correct_key}")
+            
+        st.info(f"**Rationale:** {q['rationale']}")
+        
+        st.button("Next Question ➡", on_click=_next_question)
 
 # ==========================================
 # SCREEN 3: GAME OVER
 # ==========================================
-elif st.session_state.quiz_finished:
+@st.fragment
+def _gameover():
+    ss = st.session_state
+    quiz_data = ss.quiz_data
+    answer_keys = ss.answer_keys
+    user_answers = ss.user_answers
+    sim_mode = ss.simulation_mode
     
     # Score Calculation for Simulation Mode
-    if st.session_state.simulation_mode and "sim_scored" not in st.session_state:
-        st.session_state.score = 0
-        st.session_state.incorrect_indices = []
-        for i, q in enumerate(st.session_state.quiz_data):
-            # Check if answer was recorded
-            user_ans = st.session_state.user_answers[i] if i < len(st.session_state.user_answers) else None
-            if user_ans == q['answer_key']:
-                st.session_state.score += 1
-            else:
-                st.session_state.incorrect_indices.append(q)
-        st.session_state.sim_scored = True
+    if sim_mode and "sim_scored" not in ss:
+        # Unanswered questions count as wrong
+        answers = user_answers + [None] * (len(quiz_data) - len(user_answers))
+        correct = [ans == key for ans, key in zip(answers, answer_keys)]
+        ss.score = sum(correct)
+        ss.incorrect_indices = [q_idx for q_idx, ok in zip(quiz_data, correct) if not ok]
+        ss.sim_scored = True
 
-    st.balloons()
     st.title("🎉 Session Complete!")
     
-    final_score = st.session_state.score
-    total = len(st.session_state.quiz_data)
+    final_score = ss.score
+    total = len(quiz_data)
     percent = (final_score / total) * 100
     
-    # Save to History
-    if "history_saved" not in st.session_state:
-        st.session_state.history.append({
-            "Date": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "Score": f"{final_score}/{total}",
-            "Score (%)": round(percent, 1)
-        })
-        st.session_state.history_saved = True
+    # Save to History (and celebrate once per finished exam)
+    if "history_saved" not in ss:
+        st.balloons()
+        ss.history_dates.append(datetime.now().strftime("%Y-%m-%d %H:%M"))
+        ss.history_score_strs.append(f"{final_score}/{total}")
+        ss.history_pct = np.append(ss.history_pct, np.float32(round(percent, 1)))[-_HISTORY_LIMIT:]
+        del ss.history_dates[:-_HISTORY_LIMIT]
+        del ss.history_score_strs[:-_HISTORY_LIMIT]
+        ss.history_saved = True
 
     st.metric("Final Score", f"{final_score} / {total}", f"{percent:.1f}%")
     
-    # --- NAVIGATION BUTTONS ---
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        if st.button("🏠 Home Screen"):
-            if "history_saved" in st.session_state: del st.session_state.history_saved
-            if "sim_scored" in st.session_state: del st.session_state.sim_scored
-            st.session_state.quiz_finished = False
-            st.session_state.game_active = False
-            st.rerun()
+    # --- NAVIGATION ---
+    missed_qs = ss.incorrect_indices
+    nav_labels = {"home": "🏠 Home Screen"}
+    if len(missed_qs) > 0:
+        nav_labels["retry"] = f"🔁 Retry {len(missed_qs)} Missed"
+    nav_labels["new"] = "🔄 New Exam"
+    choice = st.segmented_control("What next?", list(nav_labels), format_func=nav_labels.get, default=None)
 
-    with col2:
-        missed_qs = st.session_state.incorrect_indices
-        if len(missed_qs) > 0:
-            if st.button(f"🔁 Retry {len(missed_qs)} Missed"):
-                if "history_saved" in st.session_state: del st.session_state.history_saved
-                if "sim_scored" in st.session_state: del st.session_state.sim_scored
-                
-                st.session_state.quiz_data = missed_qs[:]
-                st.session_state.current_index = 0
-                st.session_state.score = 0
-                st.session_state.incorrect_indices = []
-                st.session_state.user_answers = []
-                st.session_state.quiz_finished = False
-                st.session_state.game_active = True
-                st.rerun()
-        else:
-            st.button("🔁 Retry Missed", disabled=True, help="You got everything right!")
+    if choice is not None:
+        ss.pop("history_saved", None)
+        ss.pop("sim_scored", None)
 
-    with col3:
-        if st.button("🔄 New Exam"):
-            if "history_saved" in st.session_state: del st.session_state.history_saved
-            if "sim_scored" in st.session_state: del st.session_state.sim_scored
-            
-            st.session_state.current_index = 0
-            st.session_state.score = 0
-            st.session_state.incorrect_indices = []
-            st.session_state.user_answers = []
-            st.session_state.quiz_finished = False
-            st.session_state.game_active = False 
-            st.rerun()
+        if choice == "home":
+            ss.quiz_finished = False
+            ss.game_active = False
+        else:
+            # Retry Missed and New Exam both start from a clean slate
+            if choice == "retry":
+                ss.quiz_data = missed_qs[:]
+                ss.answer_keys = _answer_keys(ss.quiz_data)
+            ss.current_index = 0
+            ss.score = 0
+            ss.incorrect_indices = []
+            ss.user_answers = []
+            ss.quiz_finished = False
+            ss.game_active = choice == "retry"
+            _clear_question_keys()
+        st.rerun()
             
     st.write("---")
 
     # --- EXAM REVIEW (Always shows in Simulation Mode, or for reference in Study Mode) ---
-    if st.session_state.simulation_mode:
+    if sim_mode:
         st.subheader("📝 Exam Review")
         st.write("Review your answers and the rationales below:")
+
+        # Only one page of expanders is built per rerun
+        page_count = -(-len(quiz_data) // _REVIEW_PAGE_SIZE)
+        page = 1
+        if page_count > 1:
+            page = st.number_input(f"Page (1-{page_count})", min_value=1, max_value=page_count, value=1, step=1)
+        first = (page - 1) * _REVIEW_PAGE_SIZE
         
-        for i, q in enumerate(st.session_state.quiz_data):
-            user_ans = st.session_state.user_answers[i] if i < len(st.session_state.user_answers) else "Skipped"
-            correct_ans = q['answer_key']
+        for i in range(first, min(first + _REVIEW_PAGE_SIZE, len(quiz_data))):
+            q = raw_questions[quiz_data[i]]
+            user_ans = user_answers[i] if i < len(user_answers) else "Skipped"
+            correct_ans = answer_keys[i]
             is_correct = user_ans == correct_ans
             
             # Create a collapsible box for each question
             icon = "✅" if is_correct else "❌"
             with st.expander(f"Question {i+1} {icon} (Click to expand)"):
-                st.markdown(f"**{q['question_text']}**")
+                # One markdown element per question instead of one per line
+                parts = [f"**{q['question_text']}**"]
                 
                 # Show all options
-                for key, val in sorted(q['options'].items()):
+                for key in q['option_keys']:
+                    val = q['options'][key]
                     if key == correct_ans:
-                        st.markdown(f"**{key}: {val}** *(Correct Answer)*")
+                        parts.append(f"**{key}: {val}** *(Correct Answer)*")
                     elif key == user_ans:
-                        st.markdown(f"*{key}: {val}* *(Your Answer)*")
+                        parts.append(f"*{key}: {val}* *(Your Answer)*")
                     else:
-                        st.markdown(f"{key}: {val}")
+                        parts.append(f"{key}: {val}")
                         
-                st.info(f"**Rationale:** {q['rationale']}")
-
-
-
+                parts.append(f"> **Rationale:** {q['rationale']}")
+                st.markdown("\n\n".join(parts))
 
 
+# --- Screen Dispatch ---
+if not st.session_state.game_active and not st.session_state.quiz_finished:
+    _home()
+elif st.session_state.game_active and not st.session_state.quiz_finished:
+    _game_sidebar()
+    _game()
+elif st.session_state.quiz_finished:
+    _gameover()